@@ -2,21 +2,30 @@ from typing import TYPE_CHECKING, List
 
 
 if TYPE_CHECKING:
-    from .models import Move
+    from .models import Move, Player, Team
 
 
-def breaks_constraints(moves: List["Move"]) -> bool:
-    for move in moves:
-        if breaks_practice_constraint(move):
-            return True
-        # if move.player.lock:
-        #     return True
-    return False
+def has_practice_conflict(player: "Player", team: "Team") -> bool:
+    """Check if a player can't make it to a team's practice day / location."""
+    return bool(
+        team.practice_day_bit & player.unavailable_mask
+        or team.location_bit & player.disallowed_location_mask
+    )
 
 
 def breaks_practice_constraint(move: "Move") -> bool:
-    return (
-        move.team_to is None
-        or move.team_to.practice_day in move.player.unavailable_days
-        or move.team_to.location in move.player.disallowed_locations
-    )
+    return move.team_to is None or has_practice_conflict(move.player, move.team_to)
+
+
+class PracticeConstraints:
+    """Precomputed practice constraints for every player in a league.
+
+    Player / team practice info doesn't change during assignment, so we check every pair once up
+    front with has_practice_conflict and keep each player's feasible teams. The search then only
+    tries those teams, without building moves for conflicting ones.
+    """
+
+    def __init__(self, players: List["Player"], teams: List["Team"]):
+        self.feasible_teams = {
+            p.id: [t for t in teams if not has_practice_conflict(p, t)] for p in players
+        }
@@ -1,23 +1,33 @@
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import logging
 import os
+import re
+import shelve
+import threading
 
 from geopy.extra.rate_limiter import RateLimiter
 from geopy.geocoders import Nominatim
 import numpy as np
 import pandas as pd
-from thefuzz import fuzz
 from tqdm import tqdm
 
-from cyslf.utils import DAY_MAP, FIELD_LOCATIONS, FIELD_MAP, get_dist, handle_error
-from cyslf.validation import request_validation, validate_file
+from cyslf.utils import handle_error
+from cyslf.validation import validate_file
 
 
-geolocator = Nominatim(user_agent="cyslf")
-geocode = RateLimiter(geolocator.geocode, min_delay_seconds=1 / 2)
-tqdm.pandas()
 pd.set_option("display.max_rows", None)
 
+# Geocoded addresses are saved here (one cache per server) so reruns (and later seasons) don't
+# look them up again.
+GEOCODE_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "cyslf")
+# Number of geocoding requests that can be waiting on a response at once
+GEOCODE_WORKERS = 1
+# The public Nominatim server allows one request at a time, at most one a second
+NOMINATIM_DOMAIN = "nominatim.openstreetmap.org"
+GEOCODE_DELAY = 1
+
 parser = argparse.ArgumentParser(
     description="Process raw registration forms into a standard csv."
 )
@@ -35,41 +45,138 @@ parser.add_argument(
     default=None,
 )
 
-def _lookup_location(address):
-    # If an address is poorly formed, geopy gives sad-looking warnings,
-    # so let's temporarily disable this.
-    logging.getLogger("geopy").setLevel(logging.ERROR)
+parser.add_argument(
+    "--nominatim-domain",
+    type=str,
+    help="Nominatim server to look up addresses with, eg a self-hosted one.",
+    default=NOMINATIM_DOMAIN,
+)
+
+parser.add_argument(
+    "--geocode-delay",
+    type=float,
+    help="Minimum number of seconds between address lookups (per worker). Can only be lowered for "
+    "a server other than the public one.",
+    default=GEOCODE_DELAY,
+)
+
+parser.add_argument(
+    "--geocode-workers",
+    type=int,
+    help="Number of address lookups that can be waiting on a response at once. Can only be raised "
+    "for a server other than the public one.",
+    default=GEOCODE_WORKERS,
+)
+
+
+def _make_geocoder(domain=NOMINATIM_DOMAIN, min_delay_seconds=GEOCODE_DELAY):
+    """Create a rate limited geocode function for a Nominatim server.
+
+    A geocoder's HTTP session isn't guaranteed to be thread safe, so each lookup thread gets its
+    own geocoder, rate limited separately.
+    """
+    local = threading.local()
+
+    def geocode(address):
+        if not hasattr(local, "geocode"):
+            geolocator = Nominatim(user_agent="cyslf", domain=domain)
+            local.geocode = RateLimiter(geolocator.geocode, min_delay_seconds=min_delay_seconds)
+        return local.geocode(address)
+
+    return geocode
+
+
+def _get_cache_file(domain):
+    """Get the cache file for a Nominatim server, so results from different servers aren't mixed."""
+    return os.path.join(GEOCODE_CACHE_DIR, "geocode-" + re.sub(r"[^\w.-]", "_", domain))
+
+
+def _lookup_location(geocode, address):
     location = geocode(address)
-    logging.getLogger("geopy").setLevel(logging.WARNING)
     if location:
         return location.latitude, location.longitude
     else:
         print("\033[1m" + f"Failed to find address: {address}" + "\033[0m")
         return np.nan, np.nan
 
-def _convert_addresses(filename):
+
+def _normalize_address(address):
+    """Normalize an address for caching (lowercase, collapse whitespace)."""
+    return " ".join(address.lower().split())
+
+
+def _get_address_keys(registrations):
+    """Get a key identifying each registration's address: its normalized street and postal code.
+
+    City / region are left out, since the postal code already pins them down and they're the
+    parts most often written differently (eg "Cambridge" vs "Cambridge, MA").
+    """
+    streets = registrations["Street"].astype(str).map(_normalize_address)
+    return streets + "|" + registrations["Postal Code"]
+
+
+def _lookup_locations(addresses, keys, geocode, cache_file, workers=GEOCODE_WORKERS):
+    """Look up the (latitude, longitude) of each address, only geocoding each unique key once.
+
+    keys identifies each address (see _get_address_keys). Results are saved by key to cache_file
+    so reruns don't need to look them up again. Failed lookups aren't saved, so they're retried
+    next time (e.g. after fixing a typo).
+    """
+    unique_keys = keys.drop_duplicates()
+    print(f"{len(unique_keys)} unique addresses found")
+
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    with shelve.open(cache_file) as cache:
+        locations = {key: cache[key] for key in unique_keys if key in cache}
+        missing = unique_keys[~unique_keys.isin(list(locations))]
+        print(f"{len(locations)} addresses found in cache, looking up {len(missing)}")
+
+        # If an address is poorly formed, geopy gives sad-looking warnings,
+        # so let's temporarily disable this.
+        geopy_logger = logging.getLogger("geopy")
+        geopy_level = geopy_logger.level
+        geopy_logger.setLevel(logging.ERROR)
+        try:
+            # geocode only limits how often requests are sent, so a few threads let us send the
+            # next request while earlier ones are still waiting on a response.
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(
+                    partial(_lookup_location, geocode), addresses[missing.index]
+                )
+                for key, location in tqdm(zip(missing, results), total=len(missing)):
+                    locations[key] = location
+                    if not pd.isnull(location[0]):
+                        cache[key] = location
+        finally:
+            geopy_logger.setLevel(geopy_level)
+    return keys.map(locations)
+
+
+def _convert_addresses(filename, geocode, cache_file, workers=GEOCODE_WORKERS):
     print(f"\n===Reading registration data from {filename}===")
     registrations_raw = pd.read_csv(filename)
-    registrations_raw["Postal Code"] = registrations_raw["Postal Code"].apply(lambda x: "0" + str(x))
+    registrations_raw["Postal Code"] = "0" + registrations_raw["Postal Code"].astype(str)
 
     # Look up player latitude / longitude
     print("Converting addresses to latitude / longitude")
-    registrations_raw["Postal Code"] = registrations_raw["Postal Code"].astype(str)
-    registrations_raw["Address"] = registrations_raw[
-        ["Street", "City", "Region", "Postal Code"]
-    ].agg(", ".join, axis=1)
-
-    
-
-    registrations_raw["Location"] = registrations_raw["Address"].progress_apply(
-        _lookup_location
+    registrations_raw["Address"] = registrations_raw["Street"].str.cat(
+        registrations_raw[["City", "Region", "Postal Code"]], sep=", "
     )
-    registrations_raw["latitude"] = registrations_raw["Location"].apply(lambda x: x[0])
-    registrations_raw["longitude"] = registrations_raw["Location"].apply(lambda x: x[1])
 
-    registrations_raw = registrations_raw.drop(
-        columns=["Location", "Address"]
+    locations = _lookup_locations(
+        registrations_raw["Address"],
+        _get_address_keys(registrations_raw),
+        geocode,
+        cache_file,
+        workers=workers,
     )
+    registrations_raw[["latitude", "longitude"]] = pd.DataFrame(
+        locations.tolist(),
+        columns=["latitude", "longitude"],
+        index=registrations_raw.index,
+    )
+
+    registrations_raw = registrations_raw.drop(columns=["Address"])
 
     registrations_raw.to_csv(filename, index = False)
 
@@ -88,7 +195,21 @@ def main():
     except:
         handle_error(f"Invalid registration file path {args.registration}.", True)
 
-    _convert_addresses(args.registration)
+    workers, delay = args.geocode_workers, args.geocode_delay
+    if args.nominatim_domain == NOMINATIM_DOMAIN and (
+        workers > GEOCODE_WORKERS or delay < GEOCODE_DELAY
+    ):
+        handle_error(
+            "The public Nominatim server allows at most one request a second, so "
+            "--geocode-workers and --geocode-delay are ignored for it.",
+            False,
+        )
+        workers, delay = GEOCODE_WORKERS, GEOCODE_DELAY
+
+    geocode = _make_geocoder(args.nominatim_domain, delay)
+    _convert_addresses(
+        args.registration, geocode, _get_cache_file(args.nominatim_domain), workers=workers
+    )
 
 
 
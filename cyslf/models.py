@@ -1,20 +1,27 @@
-from dataclasses import asdict, dataclass, field
-from typing import List, Optional, Set
+from dataclasses import dataclass, field, fields
+import heapq
+from typing import List, NamedTuple, Optional, Set
 from cyslf.utils import handle_error
 import pandas as pd
 
-from .constraints import breaks_practice_constraint
+from .constraints import PracticeConstraints, breaks_practice_constraint
 from .scorers import CompositeScorer
 from .utils import (
-    BOTTOM_TIER_SKILLS,
-    FIRST_ROUND_SKILL,
+    BOTTOM_TIER,
+    DAY_BITS,
+    FIRST_ROUND_TIER,
     GOALIE_THRESHOLD,
-    MID_TIER_SKILLS,
-    TOP_TIER_SKILLS,
+    LOCATION_BITS,
+    MID_TIER,
+    TOP_TIER,
+    get_day_mask,
+    get_location_mask,
+    get_tier,
 )
 from .validation import (
     validate_player_bools,
     validate_player_days,
+    validate_player_ids,
     validate_player_ints,
     validate_player_locations,
     validate_player_strs,
@@ -24,7 +31,18 @@ from .validation import (
 )
 
 
-@dataclass(frozen=True)
+# Player columns that may be left empty in the csv. These are read as nans and converted to "".
+PLAYER_STR_KEYS = [
+    "unavailable_days",
+    "preferred_days",
+    "disallowed_locations",
+    "preferred_locations",
+    "backup_locations",
+    "teammate_requests",
+]
+
+
+@dataclass(frozen=True, eq=False)
 class Player:
     id: int
     first_name: str
@@ -44,20 +62,49 @@ class Player:
     emailed_parents: bool
     school: str
     comment: str
+    # Players live in lots of sets, so keep them small and cheap to hash. dataclass(slots=True)
+    # needs Python 3.10, so declare the slots by hand. The fields are spelled out since
+    # __annotations__ isn't reliably available in the class body with lazy annotations.
+    # The masks and tier aren't fields: they're derived in __post_init__. The masks are the day /
+    # location strings as bitmasks of DAY_BITS / LOCATION_BITS, and tier is skill's tier index.
+    __slots__ = (
+        "id",
+        "first_name",
+        "last_name",
+        "grade",
+        "skill",
+        "coach_skill",
+        "parent_skill",
+        "goalie_skill",
+        "unavailable_days",
+        "preferred_days",
+        "disallowed_locations",
+        "preferred_locations",
+        "backup_locations",
+        "teammate_requests",
+        "lock",
+        "emailed_parents",
+        "school",
+        "comment",
+        "unavailable_mask",
+        "preferred_mask",
+        "disallowed_location_mask",
+        "preferred_location_mask",
+        "backup_location_mask",
+        "tier",
+    )
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __eq__(self, other):
+        return isinstance(other, Player) and self.id == other.id
 
     @classmethod
     def from_raw_dict(cls, raw_dict):
         """Preprocess a raw csv row in dictionary form to create a Player."""
         # Convert nans to empty strings
-        str_keys = [
-            "unavailable_days",
-            "preferred_days",
-            "disallowed_locations",
-            "preferred_locations",
-            "backup_locations",
-            "teammate_requests",
-        ]
-        for key in str_keys:
+        for key in PLAYER_STR_KEYS:
             if pd.isnull(raw_dict[key]):
                 raw_dict[key] = ""
 
@@ -69,7 +116,7 @@ class Player:
 
     def to_raw_dict(self) -> dict:
         """Create a raw dict that can be saved to a csv."""
-        raw_dict = asdict(self)
+        raw_dict = {key: getattr(self, key) for key in PLAYER_FIELDS}
         del raw_dict["skill"]
         return raw_dict
 
@@ -80,41 +127,77 @@ class Player:
         validate_player_bools(self)
         validate_player_days(self)
         validate_player_locations(self)
+        object.__setattr__(self, "unavailable_mask", get_day_mask(self.unavailable_days))
+        object.__setattr__(self, "preferred_mask", get_day_mask(self.preferred_days))
+        location_masks = {
+            "disallowed_location_mask": get_location_mask(self.disallowed_locations),
+            "preferred_location_mask": get_location_mask(self.preferred_locations),
+            "backup_location_mask": get_location_mask(self.backup_locations),
+        }
+        for key, mask in location_masks.items():
+            object.__setattr__(self, key, mask)
+        object.__setattr__(self, "tier", get_tier(self.skill))
 
 
+# Player fields are all flat values, so read them directly rather than with dataclasses.asdict,
+# which deep copies every value
+PLAYER_FIELDS = [f.name for f in fields(Player)]
+
 
 @dataclass
 class Team:
     name: str
     practice_day: str
     location: str
-    players: Set[Player] = field(default_factory=set)
+    # A list rather than a set: teams are small, and the scorers iterate over rosters constantly
+    players: List[Player] = field(default_factory=list)
     # TODO: practice time
+    # Running totals, kept up to date by add_player / remove_player
+    _skill_sum: float = field(default=0, init=False, repr=False, compare=False)
+    _grade_sum: float = field(default=0, init=False, repr=False, compare=False)
+    _tier_counts: List[int] = field(default_factory=list, init=False, repr=False, compare=False)
+    _goalie_count: int = field(default=0, init=False, repr=False, compare=False)
+    practice_day_bit: int = field(default=0, init=False, repr=False, compare=False)
+    location_bit: int = field(default=0, init=False, repr=False, compare=False)
+
+    def add_player(self, player: Player) -> None:
+        self.players.append(player)
+        self._skill_sum += player.skill
+        self._grade_sum += player.grade
+        self._tier_counts[player.tier] += 1
+        self._goalie_count += player.goalie_skill <= GOALIE_THRESHOLD
+
+    def remove_player(self, player: Player) -> None:
+        self.players.remove(player)
+        self._skill_sum -= player.skill
+        self._grade_sum -= player.grade
+        self._tier_counts[player.tier] -= 1
+        self._goalie_count -= player.goalie_skill <= GOALIE_THRESHOLD
 
     def get_skill(self) -> float:
         if len(self.players) == 0:
             return 0
-        return sum([player.skill for player in self.players]) / len(self.players)
+        return self._skill_sum / len(self.players)
 
     def get_grade(self) -> float:
         if len(self.players) == 0:
             return 0
-        return sum([player.grade for player in self.players]) / len(self.players)
+        return self._grade_sum / len(self.players)
 
     def get_first_round(self) -> int:
-        return sum([p.skill == FIRST_ROUND_SKILL for p in self.players])
+        return self._tier_counts[FIRST_ROUND_TIER]
 
     def get_top_tier(self) -> int:
-        return sum([p.skill in TOP_TIER_SKILLS for p in self.players])
+        return self._tier_counts[TOP_TIER]
 
     def get_mid_tier(self) -> int:
-        return sum([p.skill in MID_TIER_SKILLS for p in self.players])
+        return self._tier_counts[MID_TIER]
 
     def get_bottom_tier(self) -> int:
-        return sum([p.skill in BOTTOM_TIER_SKILLS for p in self.players])
+        return self._tier_counts[BOTTOM_TIER]
 
     def get_goalies(self) -> int:
-        return sum([p.goalie_skill <= GOALIE_THRESHOLD for p in self.players])
+        return self._goalie_count
 
     def __repr__(self):
         return (
@@ -130,11 +213,22 @@ class Team:
         validate_team_name(self)
         validate_team_day(self)
         validate_team_location(self)
+        self.practice_day_bit = DAY_BITS[self.practice_day]
+        self.location_bit = LOCATION_BITS[self.location]
+        self._skill_sum = sum([player.skill for player in self.players])
+        self._grade_sum = sum([player.grade for player in self.players])
+        self._tier_counts = [0] * 4
+        for player in self.players:
+            self._tier_counts[player.tier] += 1
+        self._goalie_count = sum([p.goalie_skill <= GOALIE_THRESHOLD for p in self.players])
+
 
+class Move(NamedTuple):
+    """A class representing moving a player from one team to another.
 
-@dataclass(frozen=True)
-class Move:
-    """A class representing moving a player from one team to another."""
+    The search creates a lot of these, so this is a NamedTuple, which is much cheaper to create
+    than a frozen dataclass.
+    """
 
     player: Player
     team_from: Optional[Team] = None
@@ -144,10 +238,16 @@ class Move:
 @dataclass
 class League:
     teams: List[Team]
-    available_players: Set[Player]  # TODO: consider a PQ
+    available_players: Set[Player]
 
     def __post_init__(self):
+        validate_player_ids(self.players)
         self.scorer = CompositeScorer(self.players, self.teams)
+        self.constraints = PracticeConstraints(self.players, self.teams)
+        # Available players ordered by (skill, id) for get_next_player. Entries aren't removed when
+        # a player is assigned, so get_next_player skips players that are no longer available.
+        self._available_heap = [(p.skill, p.id, p) for p in self.available_players]
+        heapq.heapify(self._available_heap)
 
     @property
     def players(self) -> List[Player]:
@@ -157,18 +257,27 @@ class League:
         )
 
     def get_next_player(self) -> Player:
-        """Gets the next highest-skilled available player for assignment."""
-        return min(self.available_players, key=lambda p: p.skill)
+        """Gets the next highest-skilled available player for assignment.
+
+        Raises an IndexError if there are no available players.
+        """
+        while self._available_heap[0][2] not in self.available_players:
+            heapq.heappop(self._available_heap)
+        return self._available_heap[0][2]
+
+    def _add_available_player(self, player: Player):
+        self.available_players.add(player)
+        heapq.heappush(self._available_heap, (player.skill, player.id, player))
 
     def add_player(self, player: Player, team: Team):
         # Note that the order matters. The scorer must run before the team changes.
         self.scorer.update_score_addition(player, team)
-        team.players.add(player)
+        team.add_player(player)
 
     def remove_player(self, player: Player, team: Team):
         # Note that the order matters. The scorer must run before the team changes.
         self.scorer.update_score_removal(player, team)
-        team.players.remove(player)
+        team.remove_player(player)
 
     def apply_moves(self, moves: List[Move]) -> None:
         for move in moves:
@@ -179,7 +288,7 @@ class League:
             if move.team_to is not None:
                 self.add_player(move.player, move.team_to)
             else:
-                self.available_players.add(move.player)
+                self._add_available_player(move.player)
 
     def undo_moves(self, moves: List[Move]) -> None:
         for move in moves:
@@ -190,7 +299,7 @@ class League:
             if move.team_from is not None:
                 self.add_player(move.player, move.team_from)
             else:
-                self.available_players.add(move.player)
+                self._add_available_player(move.player)
 
     def reset_league(self) -> None:
         for team in self.teams:
@@ -225,20 +334,22 @@ class League:
     @classmethod
     def from_csvs(cls, player_csv: str, team_csv: str) -> "League":
         player_info = pd.read_csv(player_csv)
+        # Normalize empty string columns once here rather than checking every player
+        player_info[PLAYER_STR_KEYS] = player_info[PLAYER_STR_KEYS].fillna("")
+        # Same as Player.from_raw_dict, but for the whole column at once
+        player_info["skill"] = player_info["coach_skill"].fillna(player_info["parent_skill"])
         team_info = pd.read_csv(team_csv)
         teams = {}
-        for _, row in team_info.iterrows():
-            teams[row["name"]] = Team(**row.to_dict())
+        for team_dict in team_info.to_dict(orient="records"):
+            teams[team_dict["name"]] = Team(**team_dict)
 
         # Add all players as available to start
-        players = []
-        assigned_team_names = []
-        for _, row in player_info.iterrows():
-            player_dict = row.to_dict()
-            team_name = player_dict.pop("team", None)
-            player = Player.from_raw_dict(player_dict)
-            assigned_team_names.append(team_name)
-            players.append(player)
+        if "team" not in player_info.columns:
+            player_info["team"] = None
+        assigned_team_names = player_info.pop("team").tolist()
+        # to_dict builds every row at once instead of creating a Series per row like iterrows. The
+        # rows are already preprocessed, so they can go straight to Player.
+        players = [Player(**player_dict) for player_dict in player_info.to_dict(orient="records")]
 
         league = cls(teams=list(teams.values()), available_players=set(players))
 
@@ -274,24 +385,21 @@ class League:
         return league
 
     def to_csv(self, player_csv: str) -> None:
-        teams = []
         players = []
+        team_names = []
         for team in self.teams:
-            team_dict = asdict(team)
-            del team_dict["players"]
-            teams.append(team_dict)
             print(team)
-            for player in team.players:
-                temp_player_dict = asdict(player)
-                temp_player_dict["team"] = team.name
-                # players.append(asdict(player) | {"team": team.name})
-                players.append(temp_player_dict)
+            players.extend(team.players)
+            team_names.extend([team.name] * len(team.players))
+        players.extend(self.available_players)
+        team_names.extend([None] * len(self.available_players))
 
-        for player in self.available_players:
-            players.append(asdict(player))
+        # Build the output column by column rather than converting each player to a dict
+        columns = {key: [getattr(p, key) for p in players] for key in PLAYER_FIELDS}
+        columns["team"] = team_names
 
         print(f"Saving player information to {player_csv}")
-        pd.DataFrame.from_records(players).to_csv(player_csv, index=False)
+        pd.DataFrame(columns).to_csv(player_csv, index=False)
 
     def __repr__(self):
         s = f"{len(self.teams)} Teams:\n"
@@ -1,8 +1,6 @@
-import itertools as it
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set
 
-from .constraints import breaks_constraints
-from .models import League, Move, Player
+from .models import League, Move, Player, Team
 from .utils import handle_error
 
 
@@ -12,45 +10,54 @@ def find_best_moves(
     depth: int = 1,
     weights: Optional[Dict[str, float]] = None,
 ) -> List[Move]:
-    queue = []
-    best_moves = []
+    best_moves: List[Move] = []
     best_score: float = -1
-    old_team = None 
+    # Players are normally assigned from the available pool (make_teams only passes those), so
+    # only scan the rosters for a player that's already on a team
+    if player in league.available_players:
+        old_team = None
+    else:
+        old_team = next((team for team in league.teams if player in team.players), None)
 
     # removed this because jason wants locked players who are on incompatible teams to be re-assigned
     # if player.lock: return []
-    
-    for team in league.teams:
-        queue.append([Move(player=player, team_from=old_team, team_to=team)])
-
-
-    while len(queue) > 0:
-        proposed_moves = queue.pop()
-        if breaks_constraints(proposed_moves):            
-            continue
-        league.apply_moves(proposed_moves)
-        score = league.scorer.get_score(weights=weights)
-        league.undo_moves(proposed_moves)
-        if score > best_score:
-            best_score = score
-            best_moves = proposed_moves
-
-        if len(proposed_moves) < depth:
-            last_team = proposed_moves[-1].team_to
-            if last_team is None:
-                handle_error(
-                    f"Proposed move tried to unassign a player, which is not allowed. Please check "
-                    f"move proposal creation. Move: {proposed_moves[-1]}", True
-                )
-
-            for p, t in it.product(last_team.players, league.teams):
-                if p.lock: continue
-                moved_players = [move.player for move in proposed_moves]
-                if p in moved_players or t.name == last_team.name:
-                    continue
-                queue.append(
-                    [*proposed_moves, Move(player=p, team_from=last_team, team_to=t)]
-                )
+
+    # The search runs for every candidate move, so look up what it uses once. Only feasible teams
+    # are searched, so no move in the chain can break the practice constraints.
+    feasible_teams = league.constraints.feasible_teams
+    # Scores candidates from the scorers' running totals, so the league is never modified here
+    get_scores_after = league.scorer.get_score_function(weights)
+
+    # Depth-first search over move chains. The current chain is extended and shrunk in place
+    # rather than copying it for every candidate.
+    proposed_moves: List[Move] = []
+    # Ids rather than players, so membership checks skip the Python-level Player.__hash__
+    moved_player_ids: Set[int] = set()
+
+    def search(player: Player, team_from: Optional[Team], teams_to: List[Team]) -> None:
+        """Try moving player from team_from to each of teams_to after the proposed moves."""
+        nonlocal best_moves, best_score
+        # Score every team the player could move to at once
+        scores = get_scores_after(proposed_moves, player, team_from, teams_to)
+        moved_player_ids.add(player.id)
+        for team, score in zip(teams_to, scores):
+            move = Move(player=player, team_from=team_from, team_to=team)
+            if score > best_score:
+                best_score = score
+                best_moves = [*proposed_moves, move]
+
+            if len(proposed_moves) + 1 < depth:
+                proposed_moves.append(move)
+                for p in team.players:
+                    if p.lock: continue
+                    if p.id in moved_player_ids:
+                        continue
+                    search(p, team, [t for t in feasible_teams[p.id] if t.name != team.name])
+                proposed_moves.pop()
+        moved_player_ids.remove(player.id)
+
+    search(player, old_team, [t for t in feasible_teams[player.id] if t is not old_team])
+
     if len(best_moves) == 0:
         handle_error(
             f"Failed to place Player {player.first_name} {player.last_name} on a team. This is "
@@ -1,24 +1,23 @@
 import argparse
-import logging
 import os
+import re
 
-from geopy.extra.rate_limiter import RateLimiter
-from geopy.geocoders import Nominatim
 import numpy as np
 import pandas as pd
 from thefuzz import fuzz
-from tqdm import tqdm
-from cyslf.utils import handle_error
 
-from cyslf.utils import DAY_MAP, FIELD_LOCATIONS, FIELD_MAP, get_dist
+from cyslf.utils import DAY_MAP, FIELD_LOCATIONS, FIELD_MAP, get_dist, handle_error
 from cyslf.validation import request_validation, validate_file
 
 
-geolocator = Nominatim(user_agent="cyslf")
-geocode = RateLimiter(geolocator.geocode, min_delay_seconds=1 / 2)
-tqdm.pandas()
 pd.set_option("display.max_rows", None)
 
+NUM_PATTERN = re.compile(r"(\d+)")
+NON_ALPHA_PATTERN = re.compile("[^a-zA-Z]")
+# FIELD_LOCATIONS as arrays, for finding each player's closest fields
+FIELD_NAMES = np.array(list(FIELD_LOCATIONS))
+FIELD_COORDS = np.array(list(FIELD_LOCATIONS.values()))
+
 parser = argparse.ArgumentParser(
     description="Process raw registration forms into a standard csv."
 )
@@ -84,20 +83,27 @@ parser.add_argument(
 
 def _extract_num(column, dtype=float):
     """Extract numbers from a string column."""
-    return column.str.extract("(\d+)", expand=False).astype(dtype)  # noqa: W605
+    # Columns like this come from multiple choice form answers, so only parse each answer once
+    answers = pd.Series(column.dropna().unique(), dtype=object)
+    numbers = answers.str.extract(NUM_PATTERN, expand=False).astype(dtype)
+    return column.map(dict(zip(answers, numbers))).astype(dtype)
 
 
 def _extract_grade(column):
     """Extract the grade number from columns, setting P to -1 and K to 0"""
     grade = column.fillna("").astype(str).str[0]
-    grade = grade.str.replace("P", "-1", regex=False)
-    grade = grade.str.replace("K", "0", regex=False)
+    grade = grade.replace({"P": "-1", "K": "0"})
     return grade.astype(float)  # Allow missing grade for now
 
 
 def _normalize_str(column):
     """Normalize string by removing non-alpha and lowercasing (partciularly for name matching)."""
-    return column.str.lower().str.replace("[^a-zA-Z]", "", regex=True)
+    return column.str.lower().str.replace(NON_ALPHA_PATTERN, "", regex=True)
+
+
+def _get_name_key(df):
+    """Get the key used to match players across forms: their normalized full name."""
+    return _normalize_str(df["first_name"] + df["last_name"])
 
 
 def _get_names(df):
@@ -118,7 +124,7 @@ def _load_existing_player_data(filename: str, division: str):
         request_validation(
             "WARNING: Please confirm that the division is spelled correctly before proceeding"
         )
-    existing_players_raw.loc[~in_division, "team"] = np.nan
+    existing_players_raw["team"] = existing_players_raw["team"].where(in_division)
 
     # changed to match coach evals
     column_map = {
@@ -141,34 +147,42 @@ def _load_existing_player_data(filename: str, division: str):
     print(
         "Lowering player skill by 1 for players that weren't previously in this division"
     )
-    existing_players.loc[~in_division, "coach_skill"] += 1
+    existing_players["coach_skill"] = existing_players["coach_skill"].mask(
+        ~in_division, existing_players["coach_skill"] + 1
+    )
 
     # Construct name for matching to current registration
-    full_name = existing_players["first_name"] + existing_players["last_name"]
-    existing_players["name_key"] = _normalize_str(full_name)
-
-    # Handle duplicates by taking the highest score for a given name
-    existing_players = (
-        existing_players.drop(columns=["first_name", "last_name"])
-        .sort_values(by="coach_skill")
-        .drop_duplicates("name_key")
+    existing_players["name_key"] = _get_name_key(existing_players)
+
+    # Handle duplicates by taking the highest score (lowest number) for a given name. Missing
+    # scores only win if there's nothing else, and nan names are kept as their own group.
+    existing_players = existing_players.drop(columns=["first_name", "last_name"])
+    best_skill = (
+        existing_players["coach_skill"]
+        .fillna(np.inf)
+        .groupby(existing_players["name_key"], sort=False, dropna=False)
+        .idxmin()
     )
+    existing_players = existing_players.loc[best_skill.values]
 
     return existing_players
 
-def _translate_practice_days(row, match1):
-    ans = [day for day in DAY_MAP.values() if row[day] == match1]
-    return "".join(ans)
+def _translate_practice_days(parent_reqs, match):
+    """Get the days marked as match, as a string of day letters per row (eg "MWR")."""
+    days = pd.Series("", index=parent_reqs.index)
+    for day in DAY_MAP.values():
+        is_match = parent_reqs[day] == match
+        days = days.where(~is_match, days + day)
+    return days
 
-def _translate_locations(row, match):
-    # TODO: optimize
-    ans = ""
-    for location in FIELD_MAP:
-        if row[location.lower()] == match:
-            for field in FIELD_MAP[location]:
-                ans += field + ", "
-    if len(ans) > 0: ans = ans[:-2]
-    return ans
+def _translate_locations(parent_reqs, match):
+    """Get the fields in each region marked as match, as a comma-separated string per row."""
+    locations = pd.Series("", index=parent_reqs.index)
+    for region, fields in FIELD_MAP.items():
+        in_region = parent_reqs[region.lower()] == match
+        locations = locations.where(~in_region, locations + ", " + ", ".join(fields))
+    # Drop the leading ", "
+    return locations.str[2:]
 
 
 def _load_parent_requests(filename):
@@ -215,13 +229,11 @@ def _load_parent_requests(filename):
 
     parent_reqs = parent_reqs.rename(columns=column_map)[column_map.values()]
 
-    parent_reqs["name_key"] = _normalize_str(
-        parent_reqs["first_name"] + parent_reqs["last_name"]
-    )
-    
-    parent_reqs["preferred_days"] = parent_reqs.apply(lambda row: _translate_practice_days(row, "Ideal"), axis=1)
+    parent_reqs["name_key"] = _get_name_key(parent_reqs)
     
-    parent_reqs["unavailable_days"] = parent_reqs.apply(lambda row: _translate_practice_days(row, "Impossible"), axis=1) 
+    parent_reqs["preferred_days"] = _translate_practice_days(parent_reqs, "Ideal")
+
+    parent_reqs["unavailable_days"] = _translate_practice_days(parent_reqs, "Impossible")
 
 
     # concat all teammate request names for easy search 
@@ -232,9 +244,9 @@ def _load_parent_requests(filename):
                                         parent_reqs["teammate_req3_firstname"].fillna('') + " " + 
                                         parent_reqs["teammate_req3_lastname"].fillna(''))
 
-    parent_reqs["preferred_locations"] =  parent_reqs.apply(lambda row: _translate_locations(row, "Ideal"), axis=1)
+    parent_reqs["preferred_locations"] = _translate_locations(parent_reqs, "Ideal")
 
-    parent_reqs["disallowed_locations"]  = parent_reqs.apply(lambda row: _translate_locations(row, "Impossible"), axis=1) 
+    parent_reqs["disallowed_locations"] = _translate_locations(parent_reqs, "Impossible")
 
 
     parent_reqs = parent_reqs.drop(
@@ -256,9 +268,9 @@ def _load_registration_data(filename):
     
     # Merge the two school columns
     has_other_school = ~pd.isnull(registrations_raw["School Name other:"])
-    registrations_raw.loc[has_other_school, "School Name"] = registrations_raw[
-        has_other_school
-    ]["School Name other:"]
+    registrations_raw["School Name"] = registrations_raw["School Name"].mask(
+        has_other_school, registrations_raw["School Name other:"]
+    )
 
 
     column_map = {
@@ -290,8 +302,7 @@ def _load_registration_data(filename):
 
 
     # Construct name for matching to current registration.
-    full_name = registrations["first_name"] + registrations["last_name"]
-    registrations["name_key"] = _normalize_str(full_name)
+    registrations["name_key"] = _get_name_key(registrations)
 
     print(f"{len(registrations)} registrations found")
     return registrations
@@ -320,8 +331,18 @@ def _merge_data(existing_players, parent_reqs, registrations):
         "school",
         "comment",
     ]
-    players = registrations.merge(existing_players, how="left", on="name_key").merge(
-        parent_reqs, how="left", on="name_key"
+    # Both right frames were deduplicated by name_key when loaded, so each registration matches at
+    # most one row. Line each of them up with the registrations by key and put everything side by
+    # side in a single concat. reindex raises on duplicate keys rather than silently duplicating
+    # players.
+    keys = registrations["name_key"]
+    players = pd.concat(
+        [registrations.reset_index(drop=True)]
+        + [
+            df.set_index("name_key").reindex(keys).reset_index(drop=True)
+            for df in (existing_players, parent_reqs)
+        ],
+        axis=1,
     )
     players["id"] = players.index.values
 
@@ -338,42 +359,38 @@ def _merge_data(existing_players, parent_reqs, registrations):
     # locations don't provide enough options, we'd like to have a fallback based on home address.
     # Using geopy, we figure out the 3 closest fields not already covered by the
     # preferred / disallowed locations and stick those in a column.
-    backup_locations = []
-    for _, row in players.iterrows():
-        lat, long = row[["latitude", "longitude"]]
-        if pd.isnull(lat) or pd.isnull(long):
-            backup_locations.append("")
-            continue
-        field_df = pd.DataFrame.from_dict(
-            FIELD_LOCATIONS, orient="index", columns=["lat", "long"]
-        )
-        # Don't think about fields if they're already in preferred/disallowed locations
-        mask = field_df.index.map(
-            lambda f: f in row.fillna("")["preferred_locations"]
-            or f in row.fillna("")["disallowed_locations"]
-        ).values.astype(bool)
-        field_df = field_df[~mask]
-        if len(field_df) <= 3:
-            backup_locations.append("")
-            continue
-        field_df["distance"] = field_df.apply(
-            lambda r: get_dist(lat, long, r["lat"], r["long"]), axis=1
-        )
-        field_df = field_df.sort_values(by="distance")
-        backup_locations.append(", ".join(field_df.head(3).index.values))
-    players["backup_locations"] = backup_locations
+    # Don't think about fields if they're already in preferred/disallowed locations
+    preferred = players["preferred_locations"].fillna("")
+    disallowed = players["disallowed_locations"].fillna("")
+    excluded = np.array(
+        [[f in p or f in d for f in FIELD_NAMES] for p, d in zip(preferred, disallowed)],
+        dtype=bool,
+    ).reshape(len(players), len(FIELD_NAMES))
+    # Distances from every player to every field, with excluded fields sorted last
+    distances = get_dist(
+        players["latitude"].to_numpy()[:, None],
+        players["longitude"].to_numpy()[:, None],
+        FIELD_COORDS[:, 0],
+        FIELD_COORDS[:, 1],
+    )
+    distances[excluded] = np.inf
+    closest_fields = FIELD_NAMES[np.argsort(distances, axis=1, kind="stable")[:, :3]]
+    has_backups = (
+        players["latitude"].notna().to_numpy()
+        & players["longitude"].notna().to_numpy()
+        & ((~excluded).sum(axis=1) > 3)
+    )
+    players["backup_locations"] = pd.Series(
+        [", ".join(fields) for fields in closest_fields], index=players.index
+    ).where(has_backups, "")
 
     players["comment"] = (
         # players["comment"].fillna("") + " || " + players["extra_comment"].fillna("")
         players["extra_comment"].fillna("")
     )
 
-    # Fill missing columns with nans
-    for col in ordered_columns:
-        if col not in players.columns:
-            players[col] = np.nan
-
-    players = players[ordered_columns]
+    # Select the output columns, filling any missing ones with nans
+    players = players.reindex(columns=ordered_columns)
 
     print(f"Finished merging. Total # of players: {len(players)}")
     return players
@@ -382,11 +399,10 @@ def _merge_data(existing_players, parent_reqs, registrations):
 def _final_sweep(players):
     print("\n===Running final checks===")
 
-    normalized_name = _normalize_str(players["first_name"] + players["last_name"])
-    name_counts = normalized_name.value_counts()
-    duplicate_names = name_counts[name_counts > 1].index.values
-    has_duplicate = normalized_name.isin(duplicate_names)
-    if has_duplicate.sum() > 0:
+    normalized_name = _get_name_key(players)
+    # Players missing a name are reported below, so don't count them as duplicates of each other
+    has_duplicate = normalized_name.duplicated(keep=False) & normalized_name.notna()
+    if has_duplicate.any():
         print(
             f"{has_duplicate.sum()} rows have names that match other rows, so please check if "
             "they're duplicates:"
@@ -397,51 +413,63 @@ def _final_sweep(players):
             ]
         )
 
-    missing_last_name = pd.isnull(players.last_name)
-    if missing_last_name.sum() > 0:
-        print(f"{missing_last_name.sum()} players are missing a last name:")
-        print(players[missing_last_name][["id", "first_name", "last_name"]])
+    # Find the missing values for all the checked columns at once
+    missing = players[
+        ["last_name", "first_name", "grade", "coach_skill", "parent_skill", "goalie_skill"]
+    ].isna()
+    missing_counts = missing.sum()
+
+    if missing_counts["last_name"] > 0:
+        print(f"{missing_counts['last_name']} players are missing a last name:")
+        print(players.loc[missing["last_name"], ["id", "first_name", "last_name"]])
 
-    missing_first_name = pd.isnull(players.first_name)
-    if missing_first_name.sum() > 0:
-        print(f"{missing_first_name.sum()} players are missing a first name:")
-        print(players[missing_first_name][["id", "first_name", "last_name"]])
+    if missing_counts["first_name"] > 0:
+        print(f"{missing_counts['first_name']} players are missing a first name:")
+        print(players.loc[missing["first_name"], ["id", "first_name", "last_name"]])
 
-    missing_grade = pd.isnull(players.grade)
-    if missing_grade.sum() > 0:
+    if missing_counts["grade"] > 0:
         print(
-            f"{missing_grade.sum()} players are missing a grade: "
-            f"{_get_names(players[missing_grade])}"
+            f"{missing_counts['grade']} players are missing a grade: "
+            f"{_get_names(players[missing['grade']])}"
         )
 
-    missing_skill = pd.isnull(players.coach_skill) & pd.isnull(players.parent_skill)
-    if missing_skill.sum() > 0:
+    missing_skill = missing["coach_skill"] & missing["parent_skill"]
+    if missing_skill.any():
         print(
             f"{missing_skill.sum()} players don't have a coach or parent skill. Automatically "
             "assigning them a skill of 5"
         )
-        players.loc[missing_skill, "parent_skill"] = 5
+        players["parent_skill"] = players["parent_skill"].mask(missing_skill, 5)
 
-    missing_goalie_skill = pd.isnull(players.goalie_skill)
-    if missing_goalie_skill.sum() > 0:
+    if missing_counts["goalie_skill"] > 0:
         print(
-            f"{missing_goalie_skill.sum()} players don't have a goalie skill. Automatically "
+            f"{missing_counts['goalie_skill']} players don't have a goalie skill. Automatically "
             "assigning them a skill of 6 (does not play goalie)."
         )
-        players.loc[missing_goalie_skill, "goalie_skill"] = 6
+        players["goalie_skill"] = players["goalie_skill"].mask(missing["goalie_skill"], 6)
+
 
+def cross_match_names(df1, df2, suffixes, limit=None):
+    """Score how similar each unmatched name in df1 is to each unmatched name in df2.
 
-def cross_match_names(df1, df2, suffixes):
+    Returns the limit best scoring pairs (all of them if limit is None), best first. Ties keep
+    the order of df1 then df2.
+    """
     # dfs are assumed to have name_key columns
 
     matched_names = np.intersect1d(df1["name_key"].values, df2["name_key"].values)
-    unmatched_df1 = df1[~df1["name_key"].isin(matched_names)]
-    unmatched_df2 = df2[~df2["name_key"].isin(matched_names)]
-    cross = unmatched_df1.merge(unmatched_df2, how="cross", suffixes=suffixes)
+    names1 = df1.loc[~df1["name_key"].isin(matched_names), "name_key"].to_numpy(dtype=object)
+    names2 = df2.loc[~df2["name_key"].isin(matched_names), "name_key"].to_numpy(dtype=object)
     keys = [f"name_key{s}" for s in suffixes]
-    if cross.shape[0] == 0: return cross
-    cross["score"] = cross.apply(lambda r: fuzz.ratio(r[keys[0]], r[keys[1]]), axis=1)
-    return cross.sort_values(by="score", ascending=False)[[keys[0], keys[1], "score"]]
+    # Only build the rows for the pairs we return, indexed by their position among all pairs
+    scores = np.array(
+        [fuzz.ratio(name1, name2) for name1 in names1 for name2 in names2], dtype=int
+    )
+    order = np.argsort(-scores, kind="stable")[:limit]
+    rows, cols = np.divmod(order, max(len(names2), 1))
+    return pd.DataFrame(
+        {keys[0]: names1[rows], keys[1]: names2[cols], "score": scores[order]}, index=order
+    )
 
 
 def main():
@@ -498,13 +526,18 @@ def main():
         f"{existing_player_match.sum()} / {len(registrations)} registrations were matched to "
         f"existing player data. {lower_division_match.sum()} came from a lower division."
     )
-    cross = cross_match_names(registrations, existing_players, ("_reg", "_old"))
-    print(
-        "If names are spelled differently across forms, they can't be automatically matched. \n"
-        f"Please check the following list of potential name matches (printing top {args.matches}):"
+    cross = cross_match_names(
+        registrations, existing_players, ("_reg", "_old"), limit=args.matches
     )
-    print(cross.head(args.matches))
-    print("Please edit the forms so the names match or manually update the player csv")
+    # Only suggest matches if some names couldn't be matched
+    if not cross.empty:
+        print(
+            "If names are spelled differently across forms, they can't be automatically matched. \n"
+            "Please check the following list of potential name matches (printing top "
+            f"{args.matches}):"
+        )
+        print(cross)
+        print("Please edit the forms so the names match or manually update the player csv")
 
     # Load parent requests
     if args.parent_requests is not None:
@@ -514,16 +547,17 @@ def main():
         print(
             f"{parent_req_match.sum()} / {len(registrations)} players had matching parent requests"
         )
-        cross = cross_match_names(registrations, parent_reqs, ("_reg", "_parent"))
-        print(
-            "If names are spelled differently across forms, they can't be automatically matched. \n"
-            "Please check the following list of potential name matches (printing top "
-            f"{args.matches}):"
-        )
-        print(cross.head(args.matches))
-        print(
-            "Please edit the forms so the names match or manually update the player csv"
+        cross = cross_match_names(
+            registrations, parent_reqs, ("_reg", "_parent"), limit=args.matches
         )
+        if not cross.empty:
+            print(
+                "If names are spelled differently across forms, they can't be automatically "
+                "matched. \nPlease check the following list of potential name matches (printing "
+                f"top {args.matches}):"
+            )
+            print(cross)
+            print("Please edit the forms so the names match or manually update the player csv")
     else:
         print("No parent requests provided.")
         parent_reqs = pd.DataFrame(
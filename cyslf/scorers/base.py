@@ -1,9 +1,11 @@
 from math import tanh
-from typing import TYPE_CHECKING, List
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 
 if TYPE_CHECKING:
-    from .models import Player, Team
+    from .models import Move, Player, Team
 
 
 def _normalize(x: float) -> float:
@@ -11,27 +13,48 @@ def _normalize(x: float) -> float:
     return 1 - tanh(x)
 
 
+def _normalize_array(x: np.ndarray) -> np.ndarray:
+    # _normalize, elementwise
+    return 1 - np.tanh(x)
+
+
 class CountScorer:
     def __init__(self, players: List["Player"], teams: List["Team"]):
         self.league_size = len(players)
-        self.count = 0
+        self.count: float = 0
         for t in teams:
             self.count += sum([self._count_player(p, t) for p in t.players])
 
-    def _count_player(self, player: "Player", team: "Team") -> bool:
+    def _count_player(self, player: "Player", team: "Team") -> float:
         raise NotImplementedError
 
     def update_score_addition(self, player: "Player", team: "Team"):
-        if self._count_player(player, team):
-            self.count += 1
+        self.count += self._count_player(player, team)
 
     def update_score_removal(self, player: "Player", team: "Team"):
-        if self._count_player(player, team):
-            self.count -= 1
+        self.count -= self._count_player(player, team)
 
     def get_score(self) -> float:
         return self.count / self.league_size
 
+    def get_scores_after(
+        self,
+        moves: Sequence["Move"],
+        player: "Player",
+        team_from: Optional["Team"],
+        teams_to: Sequence["Team"],
+    ) -> np.ndarray:
+        count = self.count
+        for move in moves:
+            if move.team_from is not None:
+                count -= self._count_player(move.player, move.team_from)
+            if move.team_to is not None:
+                count += self._count_player(move.player, move.team_to)
+        if team_from is not None:
+            count -= self._count_player(player, team_from)
+        counts = count + np.array([self._count_player(player, t) for t in teams_to], dtype=float)
+        return counts / self.league_size
+
 
 def _calculate_rmse(values, ideal_value):
     """Calculate the root mean squared error from a list of values and ideal value"""
@@ -39,18 +62,14 @@ def _calculate_rmse(values, ideal_value):
     return (sum(squared_errors) / len(squared_errors)) ** 0.5
 
 
-def _update_rolling_mean(old_mean, old_size, value, add_value):
-    """Calculate the updated rolling mean for added or removed values."""
-    if add_value:
-        return (old_size * old_mean + value) / (old_size + 1)
-    else:
-        if old_size == 1:
-            # If there aren't any more points, return 0 to avoid a divide-by-zero error
-            return 0
-        return (old_size * old_mean - value) / (old_size - 1)
+class CountParityScorer:
+    """Scores how evenly the counted players are spread across teams.
 
+    Counts are integers, so we also keep the exact sum of squared team counts. The rmse from the
+    ideal (mean) count is then sqrt(mean(count^2) - mean(count)^2), which only needs the counts of
+    teams that change.
+    """
 
-class CountParityScorer:
     def __init__(self, players: List["Player"], teams: List["Team"]):
         self.total_player_count = 0
         self.team_counts = {team.name: 0 for team in teams}
@@ -58,6 +77,7 @@ class CountParityScorer:
             team_count = sum([self._count_player(p) for p in t.players])
             self.total_player_count += team_count
             self.team_counts[t.name] += team_count
+        self.sum_squared_counts = sum([c**2 for c in self.team_counts.values()])
 
     def _count_player(self, player: "Player") -> bool:
         raise NotImplementedError
@@ -65,53 +85,147 @@ class CountParityScorer:
     def update_score_addition(self, player: "Player", team: "Team"):
         if self._count_player(player):
             self.total_player_count += 1
+            self.sum_squared_counts += 2 * self.team_counts[team.name] + 1
             self.team_counts[team.name] += 1
 
     def update_score_removal(self, player: "Player", team: "Team"):
         if self._count_player(player):
             self.total_player_count -= 1
+            self.sum_squared_counts -= 2 * self.team_counts[team.name] - 1
             self.team_counts[team.name] -= 1
 
+    def _score(self, sum_squared_counts, total_player_count):
+        # Works on floats or numpy arrays of sums of squares
+        n_teams = len(self.team_counts)
+        ideal_team_count = total_player_count / n_teams
+        mean_squared_error = sum_squared_counts / n_teams - ideal_team_count**2
+        return _normalize_array(np.sqrt(np.maximum(mean_squared_error, 0)))
+
     def get_score(self) -> float:
-        ideal_team_count = self.total_player_count / len(self.team_counts)
-        rmse = _calculate_rmse(self.team_counts.values(), ideal_team_count)
-        return _normalize(rmse)
+        return float(self._score(self.sum_squared_counts, self.total_player_count))
+
+    def get_scores_after(
+        self,
+        moves: Sequence["Move"],
+        player: "Player",
+        team_from: Optional["Team"],
+        teams_to: Sequence["Team"],
+    ) -> np.ndarray:
+        count_changes: Dict[str, int] = {}
+        total_player_count = self.total_player_count
+        for move in moves:
+            if not self._count_player(move.player):
+                continue
+            if move.team_from is not None:
+                name = move.team_from.name
+                count_changes[name] = count_changes.get(name, 0) - 1
+                total_player_count -= 1
+            if move.team_to is not None:
+                name = move.team_to.name
+                count_changes[name] = count_changes.get(name, 0) + 1
+                total_player_count += 1
+        counted = self._count_player(player)
+        if counted and team_from is not None:
+            count_changes[team_from.name] = count_changes.get(team_from.name, 0) - 1
+            total_player_count -= 1
+
+        sum_squared_counts = self.sum_squared_counts
+        for name, change in count_changes.items():
+            count = self.team_counts[name]
+            sum_squared_counts += (count + change) ** 2 - count**2
+        if not counted:
+            return np.full(len(teams_to), self._score(sum_squared_counts, total_player_count))
+
+        # Adding the player to a team with count c adds (c + 1)^2 - c^2 to the sum of squares
+        counts = np.array(
+            [self.team_counts[t.name] + count_changes.get(t.name, 0) for t in teams_to]
+        )
+        return self._score(sum_squared_counts + 2 * counts + 1, total_player_count + 1)
 
 
 class MeanParityScorer:
+    """Scores how close each team's mean value is to the league mean.
+
+    We keep each team's value sum and size (rather than its mean) so means stay exact however many
+    times players are added and removed.
+    """
+
     def __init__(self, players: List["Player"], teams: List["Team"]):
         self.total_value = 0
-        self.team_means = {team.name: 0.0 for team in teams}
+        self.total_players = 0
+        self.team_totals = {team.name: (0, 0) for team in teams}
         for t in teams:
-            team_mean = sum([self._get_value(p) for p in t.players])
-            self.total_value += team_mean
-            self.team_means[t.name] += team_mean
-        self.total_players = sum([len(t.players) for t in teams])
+            team_value = sum([self._get_value(p) for p in t.players])
+            self.total_value += team_value
+            self.total_players += len(t.players)
+            self.team_totals[t.name] = (team_value, len(t.players))
 
-    def _get_value(self, player: "Player") -> bool:
+    def _get_value(self, player: "Player") -> float:
         raise NotImplementedError
 
     def update_score_addition(self, player: "Player", team: "Team"):
-        self.total_value += self._get_value(player)
+        value = self._get_value(player)
+        self.total_value += value
         self.total_players += 1
-        self.team_means[team.name] = _update_rolling_mean(
-            self.team_means[team.name],
-            len(team.players),
-            self._get_value(player),
-            add_value=True,
-        )
+        team_value, team_size = self.team_totals[team.name]
+        self.team_totals[team.name] = (team_value + value, team_size + 1)
 
     def update_score_removal(self, player: "Player", team: "Team"):
-        self.total_value -= self._get_value(player)
+        value = self._get_value(player)
+        self.total_value -= value
         self.total_players -= 1
-        self.team_means[team.name] = _update_rolling_mean(
-            self.team_means[team.name],
-            len(team.players),
-            self._get_value(player),
-            add_value=False,
-        )
+        team_value, team_size = self.team_totals[team.name]
+        self.team_totals[team.name] = (team_value - value, team_size - 1)
 
     def get_score(self) -> float:
         ideal_value = self.total_value / self.total_players
-        rmse = _calculate_rmse(self.team_means.values(), ideal_value)
-        return _normalize(rmse)
+        # Empty teams count as a mean of 0
+        team_means = [value / size if size else 0 for value, size in self.team_totals.values()]
+        return _normalize(_calculate_rmse(team_means, ideal_value))
+
+    def get_scores_after(
+        self,
+        moves: Sequence["Move"],
+        player: "Player",
+        team_from: Optional["Team"],
+        teams_to: Sequence["Team"],
+    ) -> np.ndarray:
+        team_totals: Dict[str, Tuple[float, int]] = self.team_totals.copy()
+        total_value = self.total_value
+        total_players = self.total_players
+        for move in moves:
+            value = self._get_value(move.player)
+            if move.team_from is not None:
+                team_value, team_size = team_totals[move.team_from.name]
+                team_totals[move.team_from.name] = (team_value - value, team_size - 1)
+                total_value -= value
+                total_players -= 1
+            if move.team_to is not None:
+                team_value, team_size = team_totals[move.team_to.name]
+                team_totals[move.team_to.name] = (team_value + value, team_size + 1)
+                total_value += value
+                total_players += 1
+        value = self._get_value(player)
+        if team_from is not None:
+            team_value, team_size = team_totals[team_from.name]
+            team_totals[team_from.name] = (team_value - value, team_size - 1)
+        else:
+            total_value += value
+            total_players += 1
+
+        # The player ends up on one of teams_to either way, so the ideal value is the same for all
+        ideal_value = total_value / total_players
+        squared_errors = sum(
+            [((v / size if size else 0) - ideal_value) ** 2 for v, size in team_totals.values()]
+        )
+
+        # Swap each candidate team's old squared error for its error with the player added
+        to_totals = np.array([team_totals[t.name] for t in teams_to], dtype=float).reshape(-1, 2)
+        to_values, to_sizes = to_totals[:, 0], to_totals[:, 1]
+        old_means = np.divide(to_values, to_sizes, out=np.zeros(len(teams_to)), where=to_sizes > 0)
+        new_means = (to_values + value) / (to_sizes + 1)
+        squared_errors = (
+            squared_errors - (old_means - ideal_value) ** 2 + (new_means - ideal_value) ** 2
+        )
+        rmse = np.sqrt(np.maximum(squared_errors, 0) / len(team_totals))
+        return _normalize_array(rmse)
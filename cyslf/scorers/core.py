@@ -8,6 +8,9 @@ exposes an interface containing:
 * update_score_addition(player, team): update internal metrics associated with adding player->team
 * update_score_removal(player, team): update internal metrics associated with removing player->team
 * get_score(): return a score between 0 and 1
+* get_scores_after(moves, player, team_from, teams_to): return the scores the league would have
+  after moves and then moving player from team_from to each of teams_to, as a numpy array. This
+  doesn't change any internal metrics.
 
 base.py contains some abstract base scorers that we use here.
 
@@ -15,52 +18,33 @@ CompositeScorer is the primary exported scorer -- it goes scores everything in S
 """
 
 
-from typing import TYPE_CHECKING, Dict, List, Optional
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Sequence
 
-from ..utils import (
-    BOTTOM_TIER_SKILLS,
-    FIRST_ROUND_SKILL,
-    GOALIE_THRESHOLD,
-    MID_TIER_SKILLS,
-    TOP_TIER_SKILLS,
-)
+import numpy as np
+
+from ..utils import BOTTOM_TIER, FIRST_ROUND_TIER, GOALIE_THRESHOLD, MID_TIER, TOP_TIER
 from .base import CountParityScorer, CountScorer, MeanParityScorer
 
 
 if TYPE_CHECKING:
-    from .models import Player, Team
+    from .models import Move, Player, Team
 
 
 # CONVENIENCE SCORERS
 class PracticeDayScorer(CountScorer):
     def _count_player(self, player: "Player", team: "Team") -> bool:
-        return team.practice_day in player.preferred_days
-
+        return bool(team.practice_day_bit & player.preferred_mask)
 
-class LocationScorer:
-    def __init__(self, players: List["Player"], teams: List["Team"]):
-        self.league_size = len(players)
-        self.count = 0.0
-        for t in teams:
-            self.count += sum([self._count_player(p, t) for p in t.players])
 
+class LocationScorer(CountScorer):
     def _count_player(self, player: "Player", team: "Team") -> float:
-        if team.location in player.preferred_locations:
+        if team.location_bit & player.preferred_location_mask:
             return 1
-        elif team.location in player.backup_locations:
+        elif team.location_bit & player.backup_location_mask:
             return 0.5
         else:
             return 0
 
-    def update_score_addition(self, player: "Player", team: "Team"):
-        self.count += self._count_player(player, team)
-
-    def update_score_removal(self, player: "Player", team: "Team"):
-        self.count -= self._count_player(player, team)
-
-    def get_score(self) -> float:
-        return self.count / self.league_size
-
 
 class TeammateScorer:
     """Scorer for up to 1 teammate request
@@ -75,46 +59,78 @@ class TeammateScorer:
         # Assumes teams are empty, which is technically how we do it
         self.league_size = len(players)
         self.friend_matches = 0
-
-    def update_score_addition(self, player: "Player", team: "Team"):
+        self.names = {p.id: f"{p.first_name} {p.last_name}" for p in players}
+
+    def _count_matches(self, player: "Player", teammates: Iterable["Player"]) -> int:
+        """Count the friend matches that depend on player being on a team with teammates.
+
+        player itself is skipped if it's in teammates, so a player who lists their own name isn't
+        counted against themself. This runs for every candidate move, so players are compared by id
+        directly rather than through Player.__eq__.
+        """
+        names = self.names
+        player_id = player.id
+        player_name = names[player_id]
+        matches = 0
         request_satisfied = False
-        for p in team.players:
-            name = f"{p.first_name} {p.last_name}"
-            if name in player.teammate_requests and not request_satisfied:
-                self.friend_matches += 1
+        for p in teammates:
+            if p.id == player_id:
+                continue
+            if not request_satisfied and names[p.id] in player.teammate_requests:
+                matches += 1
                 request_satisfied = True
-            if f"{player.first_name} {player.last_name}" in p.teammate_requests:
+            if player_name in p.teammate_requests:
                 player_is_unique = True
-                for q in team.players:
-                    if p == q:
+                for q in teammates:
+                    if q.id == p.id or q.id == player_id:
                         continue
-                    if f"{q.first_name} {q.last_name}" in p.teammate_requests:
+                    if names[q.id] in p.teammate_requests:
                         player_is_unique = False
                         break
                 if player_is_unique:
-                    self.friend_matches += 1
+                    matches += 1
+        return matches
+
+    def update_score_addition(self, player: "Player", team: "Team"):
+        self.friend_matches += self._count_matches(player, team.players)
 
     def update_score_removal(self, player: "Player", team: "Team"):
-        request_satisfied = False
-        for p in team.players:
-            name = f"{p.first_name} {p.last_name}"
-            if name in player.teammate_requests and not request_satisfied:
-                self.friend_matches -= 1
-                request_satisfied = True
-            if f"{player.first_name} {player.last_name}" in p.teammate_requests:
-                player_is_unique = True
-                for q in team.players:
-                    if p == q or player == q:
-                        continue
-                    if f"{q.first_name} {q.last_name}" in p.teammate_requests:
-                        player_is_unique = False
-                        break
-                if player_is_unique:
-                    self.friend_matches -= 1
+        self.friend_matches -= self._count_matches(player, team.players)
 
     def get_score(self) -> float:
         return self.friend_matches / self.league_size
 
+    def get_scores_after(
+        self,
+        moves: Sequence["Move"],
+        player: "Player",
+        team_from: Optional["Team"],
+        teams_to: Sequence["Team"],
+    ) -> np.ndarray:
+        friend_matches = self.friend_matches
+        # Team rosters as they'd be part way through the moves, copied only for teams that change
+        rosters: Dict[str, List["Player"]] = {}
+        for move in moves:
+            if move.team_from is not None:
+                roster = rosters.get(move.team_from.name)
+                if roster is None:
+                    roster = rosters[move.team_from.name] = list(move.team_from.players)
+                roster.remove(move.player)
+                friend_matches -= self._count_matches(move.player, roster)
+            if move.team_to is not None:
+                roster = rosters.get(move.team_to.name)
+                if roster is None:
+                    roster = rosters[move.team_to.name] = list(move.team_to.players)
+                friend_matches += self._count_matches(move.player, roster)
+                roster.append(move.player)
+        if team_from is not None:
+            # _count_matches skips the player itself, so the roster doesn't need copying here
+            roster = rosters.get(team_from.name, team_from.players)
+            friend_matches -= self._count_matches(player, roster)
+
+        matches = [self._count_matches(player, rosters.get(t.name, t.players)) for t in teams_to]
+        return (friend_matches + np.array(matches, dtype=float)) / self.league_size
+
 
 # PARITY SCORERS
 class SizeScorer(CountParityScorer):
@@ -124,22 +140,22 @@ class SizeScorer(CountParityScorer):
 
 class FirstRoundScorer(CountParityScorer):
     def _count_player(self, player: "Player") -> bool:
-        return player.skill == FIRST_ROUND_SKILL
+        return player.tier == FIRST_ROUND_TIER
 
 
 class TopTierScorer(CountParityScorer):
     def _count_player(self, player: "Player") -> bool:
-        return player.skill in TOP_TIER_SKILLS
+        return player.tier == TOP_TIER
 
 
 class MidTierScorer(CountParityScorer):
     def _count_player(self, player: "Player") -> bool:
-        return player.skill in MID_TIER_SKILLS
+        return player.tier == MID_TIER
 
 
 class BottomTierScorer(CountParityScorer):
     def _count_player(self, player: "Player") -> bool:
-        return player.skill in BOTTOM_TIER_SKILLS
+        return player.tier == BOTTOM_TIER
 
 
 class GoalieScorer(CountParityScorer):
@@ -202,6 +218,37 @@ class CompositeScorer:
         for scorer in self.scorers.values():
             scorer.update_score_removal(player, team)  # type: ignore
 
+    def get_score_function(
+        self, weights: Optional[Dict[str, float]] = None
+    ) -> Callable[[Sequence["Move"], "Player", Optional["Team"], Sequence["Team"]], np.ndarray]:
+        """Return a function computing get_scores_after for the weighted sum of scorers.
+
+        This lets the search score candidate moves without applying and undoing them, scoring all
+        the teams a player could move to at once. The weighted scorers are resolved once up front,
+        and scorers with zero weight are skipped entirely.
+        """
+        if weights is None:
+            weights = DEFAULT_WEIGHTS
+        weighted_scorers = [
+            (self.scorers[scorer_key].get_scores_after, weight)  # type: ignore
+            for scorer_key, weight in weights.items()
+            if weight != 0
+        ]
+        total_weight = sum(weights.values())
+
+        def get_scores_after(
+            moves: Sequence["Move"],
+            player: "Player",
+            team_from: Optional["Team"],
+            teams_to: Sequence["Team"],
+        ) -> np.ndarray:
+            scores = np.zeros(len(teams_to))
+            for get_scorer_scores_after, weight in weighted_scorers:
+                scores += weight * get_scorer_scores_after(moves, player, team_from, teams_to)
+            return scores / total_weight
+
+        return get_scores_after
+
     def get_score(self, weights: Optional[Dict[str, float]] = None) -> float:
         if weights is None:
             weights = DEFAULT_WEIGHTS
@@ -210,11 +257,11 @@ class CompositeScorer:
         s = ""
         verbose = False
         for scorer_key, weight in weights.items():
-            scorer = self.scorers[scorer_key]
-            score += weight * scorer.get_score()  # type: ignore
+            scorer_score = self.scorers[scorer_key].get_score()  # type: ignore
+            score += weight * scorer_score
             total_weight += weight
             if verbose:
-                s += f"{scorer.get_score():.3f} "  # type: ignore
+                s += f"{scorer_score:.3f} "
         if verbose:
             print(s, list(weights.keys()))
         return score / total_weight
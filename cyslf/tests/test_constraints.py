@@ -0,0 +1,45 @@
+import itertools as it
+
+from ..constraints import PracticeConstraints, breaks_practice_constraint
+from ..models import Move, Player, Team
+
+
+players = [
+    Player(
+        id=i,
+        first_name="first",
+        last_name=f"last{i}",
+        grade=3,
+        skill=4,
+        coach_skill=4,
+        parent_skill=4,
+        goalie_skill=6,
+        unavailable_days=unavailable_days,
+        preferred_days="",
+        disallowed_locations=disallowed_locations,
+        preferred_locations="",
+        backup_locations="",
+        teammate_requests="",
+        lock=False,
+        emailed_parents=False,
+        school="school",
+        comment="",
+    )
+    for i, (unavailable_days, disallowed_locations) in enumerate(
+        [("", ""), ("MW", ""), ("", "Danehy, Ahern"), ("T", "Common")]
+    )
+]
+teams = [
+    Team(name="red", practice_day="M", location="Danehy"),
+    Team(name="blue", practice_day="T", location="Ahern"),
+    Team(name="green", practice_day="W", location="Common"),
+]
+
+
+def test_practice_constraints_match_moves():
+    """The precomputed feasible teams should agree with checking each move directly."""
+    constraints = PracticeConstraints(players, teams)
+    for player, team in it.product(players, teams):
+        move = Move(player=player, team_from=None, team_to=team)
+        assert (team in constraints.feasible_teams[player.id]) != breaks_practice_constraint(move)
+    assert breaks_practice_constraint(Move(player=players[0]))
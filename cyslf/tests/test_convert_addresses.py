@@ -0,0 +1,131 @@
+from collections import namedtuple
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .. import convert_addresses
+from ..convert_addresses import (
+    _convert_addresses,
+    _get_cache_file,
+    _lookup_locations,
+    _make_geocoder,
+)
+
+
+Location = namedtuple("Location", ["latitude", "longitude"])
+
+
+class FakeGeocoder:
+    """Stands in for a geocode function, recording the addresses it was asked to look up."""
+
+    def __init__(self):
+        self.addresses = []
+
+    def __call__(self, address):
+        self.addresses.append(address)
+        if address.startswith("bad"):
+            return None
+        return Location(len(address), -len(address))
+
+
+def write_registrations(filename):
+    pd.DataFrame(
+        {
+            "Street": ["1 Main St", "1 main  st", "2 Elm St", "bad", "2 Elm St"],
+            "City": ["Cambridge", "cambridge", "Cambridge", "Cambridge", "Cambridge, MA"],
+            "Region": ["MA"] * 5,
+            "Postal Code": [2139, 2139, 2140, 2141, 2140],
+        }
+    ).to_csv(filename, index=False)
+
+
+def test_convert_addresses_caches_lookups(tmp_path):
+    filename = tmp_path / "registration.csv"
+    write_registrations(filename)
+    cache_file = str(tmp_path / "cache" / "geocode-test")
+
+    # Addresses that only differ in case, spacing or city are looked up once
+    geocode = FakeGeocoder()
+    _convert_addresses(filename, geocode, cache_file, workers=2)
+    assert sorted(geocode.addresses) == [
+        "1 Main St, Cambridge, MA, 02139",
+        "2 Elm St, Cambridge, MA, 02140",
+        "bad, Cambridge, MA, 02141",
+    ]
+    registrations = pd.read_csv(filename)
+    expected_latitudes = [31, 31, 30, np.nan, 30]
+    np.testing.assert_array_equal(registrations["latitude"], expected_latitudes)
+    np.testing.assert_array_equal(registrations["longitude"], -np.array(expected_latitudes))
+
+    # The second run is served from the cache, except for the failed lookup
+    geocode = FakeGeocoder()
+    _convert_addresses(filename, geocode, cache_file)
+    assert geocode.addresses == ["bad, Cambridge, MA, 02141"]
+    np.testing.assert_array_equal(pd.read_csv(filename)["latitude"], expected_latitudes)
+
+
+def test_cache_files_are_per_domain(tmp_path, monkeypatch):
+    monkeypatch.setattr(convert_addresses, "GEOCODE_CACHE_DIR", str(tmp_path))
+    public_cache = _get_cache_file(convert_addresses.NOMINATIM_DOMAIN)
+    local_cache = _get_cache_file("localhost:8080/nominatim")
+    assert public_cache != local_cache
+    assert local_cache == str(tmp_path / "geocode-localhost_8080_nominatim")
+
+    addresses = pd.Series(["1 Main St, Cambridge, MA, 02139"])
+    keys = pd.Series(["1 main st|02139"])
+    _lookup_locations(addresses, keys, FakeGeocoder(), public_cache)
+    # Results from one server aren't reused for another
+    geocode = FakeGeocoder()
+    _lookup_locations(addresses, keys, geocode, local_cache)
+    assert geocode.addresses == addresses.tolist()
+
+
+def test_make_geocoder_per_thread(monkeypatch):
+    geolocators = []
+
+    class FakeNominatim:
+        def __init__(self, user_agent, domain):
+            self.domain = domain
+            geolocators.append(self)
+
+        def geocode(self, address):
+            return Location(0, 0)
+
+    monkeypatch.setattr(convert_addresses, "Nominatim", FakeNominatim)
+    geocode = _make_geocoder("localhost", min_delay_seconds=0)
+    geocode("1 Main St")
+    geocode("2 Elm St")
+    thread = threading.Thread(target=geocode, args=("3 Oak St",))
+    thread.start()
+    thread.join()
+    # One geocoder per thread, reused across that thread's lookups
+    assert len(geolocators) == 2
+    assert all(g.domain == "localhost" for g in geolocators)
+
+
+def test_public_server_is_rate_limited(tmp_path, monkeypatch):
+    filename = tmp_path / "registration.csv"
+    write_registrations(filename)
+    calls = []
+    monkeypatch.setattr(
+        convert_addresses, "_make_geocoder", lambda domain, delay: calls.append((domain, delay))
+    )
+    monkeypatch.setattr(
+        convert_addresses,
+        "_convert_addresses",
+        lambda filename, geocode, cache_file, workers: calls.append(workers),
+    )
+    options = ["--reg", str(filename), "--geocode-workers", "4", "--geocode-delay", "0.1"]
+
+    monkeypatch.setattr(sys, "argv", ["convert-addresses", *options])
+    convert_addresses.main()
+    assert calls == [(convert_addresses.NOMINATIM_DOMAIN, 1), 1]
+
+    calls.clear()
+    monkeypatch.setattr(
+        sys, "argv", ["convert-addresses", *options, "--nominatim-domain", "localhost"]
+    )
+    convert_addresses.main()
+    assert calls == [("localhost", 0.1), 4]
@@ -1,6 +1,9 @@
+from dataclasses import replace
+
 import pandas as pd
+import pytest
 
-from ..models import Player
+from ..models import League, Move, Player, Team
 
 
 example_player = Player(
@@ -30,3 +33,44 @@ def test_player_io():
     # This is not a super detailed / rigorous test (particularly of all the validation) but it
     # should tell us naively whether or not reading / writing is stable
     assert example_player == Player.from_raw_dict(example_player.to_raw_dict())
+    # Players compare equal by id, so also check that the rest of the data survived
+    raw_dict = example_player.to_raw_dict()
+    assert raw_dict == Player.from_raw_dict(example_player.to_raw_dict()).to_raw_dict()
+
+
+@pytest.mark.parametrize("practice_day", ["TW", "", "X", float("nan")])
+def test_team_practice_day_validation(practice_day):
+    """Teams should practice on exactly one valid day."""
+    Team(name="red", practice_day="M", location="Danehy")
+    with pytest.raises(ValueError):
+        Team(name="red", practice_day=practice_day, location="Danehy")
+
+
+def test_get_next_player():
+    """The next player should be the best (lowest skill) available player, with ties by id."""
+    players = [replace(example_player, id=i, skill=skill) for i, skill in enumerate([3, 1, 3, 2, 1])]
+    red = Team(name="red", practice_day="M", location="Danehy")
+    league = League(teams=[red], available_players=set(players))
+
+    def check_next_player():
+        expected = min(league.available_players, key=lambda p: (p.skill, p.id))
+        assert league.get_next_player() is expected
+
+    check_next_player()
+    # Assign players, including the next one, then unassign and re-add them
+    moves = [Move(player=players[i], team_from=None, team_to=red) for i in [1, 3]]
+    league.apply_moves(moves)
+    check_next_player()
+    league.undo_moves(moves[1:])
+    check_next_player()
+    league.apply_moves([Move(player=players[4], team_from=None, team_to=red)])
+    check_next_player()
+    league.apply_moves([Move(player=players[1], team_from=red, team_to=None)])
+    check_next_player()
+
+    for player in list(league.available_players):
+        league.apply_moves([Move(player=player, team_from=None, team_to=red)])
+        if league.available_players:
+            check_next_player()
+    with pytest.raises(IndexError):
+        league.get_next_player()
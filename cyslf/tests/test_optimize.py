@@ -0,0 +1,117 @@
+import pytest
+
+from ..constraints import breaks_practice_constraint
+from ..models import League, Move, Player, Team
+from ..optimize import find_best_moves
+
+
+def make_player(i, unavailable_days="", lock=False):
+    return Player(
+        id=i,
+        first_name="first",
+        last_name=f"last{i}",
+        grade=1 + i % 4,
+        skill=1 + i % 7,
+        coach_skill=1 + i % 7,
+        parent_skill=1 + i % 7,
+        goalie_skill=1 + i % 5,
+        unavailable_days=unavailable_days,
+        preferred_days="MTW"[i % 3],
+        disallowed_locations="",
+        preferred_locations=["Danehy", "Ahern", ""][i % 3],
+        backup_locations="",
+        teammate_requests=f"first last{(i + 3) % 10}",
+        lock=lock,
+        emailed_parents=False,
+        school="school",
+        comment="",
+    )
+
+
+def make_teams():
+    return [
+        Team(name="red", practice_day="M", location="Danehy"),
+        Team(name="blue", practice_day="T", location="Ahern"),
+        Team(name="green", practice_day="W", location="Common"),
+    ]
+
+
+def make_league(locked_ids=()):
+    """Make a league with 9 players on 3 teams and one available player who can't make Tuesdays."""
+    teams = make_teams()
+    players = [make_player(i, lock=i in locked_ids) for i in range(9)]
+    new_player = make_player(11, unavailable_days="T")
+    league = League(teams=teams, available_players={*players, new_player})
+    for i, player in enumerate(players):
+        league.apply_moves([Move(player=player, team_from=None, team_to=teams[i % 3])])
+    return league, new_player
+
+
+def get_move_chains(league, player, depth):
+    """List every chain of moves find_best_moves may try, like the original queue-based search."""
+    chains = []
+
+    def extend(chain, player, team_from, moved_players):
+        for team in league.teams:
+            move = Move(player=player, team_from=team_from, team_to=team)
+            if team is team_from or breaks_practice_constraint(move):
+                continue
+            chains.append([*chain, move])
+            if len(chain) + 1 < depth:
+                for p in team.players:
+                    if p.lock or p in moved_players:
+                        continue
+                    extend([*chain, move], p, team, moved_players | {p})
+
+    extend([], player, None, {player})
+    return chains
+
+
+def get_score(league, moves):
+    league.apply_moves(moves)
+    score = league.scorer.get_score()
+    league.undo_moves(moves)
+    return score
+
+
+def as_tuples(moves):
+    return [(m.player.id, m.team_from and m.team_from.name, m.team_to.name) for m in moves]
+
+
+@pytest.mark.parametrize("depth", [1, 2])
+@pytest.mark.parametrize("locked_ids", [(), (1, 5)])
+def test_find_best_moves_matches_brute_force(depth, locked_ids):
+    """The search should find the best scoring chain of all feasible, unlocked move chains."""
+    league, player = make_league(locked_ids)
+    chains = get_move_chains(league, player, depth)
+    best_score = max(get_score(league, chain) for chain in chains)
+
+    best_moves = find_best_moves(player, league, depth=depth)
+    assert as_tuples(best_moves) in [as_tuples(chain) for chain in chains]
+    assert get_score(league, best_moves) == pytest.approx(best_score)
+    # Searching doesn't change the league
+    assert player in league.available_players
+    assert league.scorer.get_score() == pytest.approx(get_score(league, []))
+
+
+def test_find_best_moves_skips_locked_and_infeasible():
+    league, player = make_league(locked_ids=range(9))
+    _, blue, green = league.teams
+    # Blue would be the best team, but it practices on Tuesdays
+    blue_move = Move(player=player, team_from=None, team_to=blue)
+    green_move = Move(player=player, team_from=None, team_to=green)
+    assert get_score(league, [blue_move]) > get_score(league, [green_move])
+    for depth in [1, 2, 3]:
+        # Everyone else is locked, so only the new player can move
+        assert as_tuples(find_best_moves(player, league, depth=depth)) == [(11, None, "green")]
+
+
+def test_find_best_moves_ties_pick_first_team():
+    """Equally scored moves keep the first team in the league's team order."""
+    teams = [Team(name=name, practice_day="M", location="Danehy") for name in ["a", "b", "c"]]
+    player = make_player(1)
+    league = League(teams=teams, available_players={player})
+    # The teams are identical, so every move scores the same
+    scores = league.scorer.get_score_function()([], player, None, teams)
+    assert scores[0] == scores[1] == scores[2]
+    assert as_tuples(find_best_moves(player, league)) == [(1, None, "a")]
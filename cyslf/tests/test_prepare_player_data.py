@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+from ..prepare_player_data import (
+    _load_existing_player_data,
+    _merge_data,
+    _translate_locations,
+    _translate_practice_days,
+    cross_match_names,
+)
+
+
+def test_existing_player_duplicates(tmp_path):
+    """Duplicate names should keep the best coach skill, and the first row of tied skills."""
+    filename = tmp_path / "coach_evals.csv"
+    pd.DataFrame(
+        {
+            "division": ["Spring Boys Grades 3-4"] * 4 + ["Spring Boys Grades 1-2"],
+            "team": ["red", "blue", "green", "blue", "red"],
+            "rating_overall (1 is high)": [3, 3, np.nan, 4, 2],
+            "rating_goalie": [2, 6, 5, 4, 3],
+            "lastname": ["Thomas", "Thomas5", "Lee", "Lee", "Kim"],
+            "firstname": ["Lou", "Lou", "Ann", "Ann", "Bo"],
+        }
+    ).to_csv(filename, index=False)
+
+    existing_players = _load_existing_player_data(filename, "Boys Grades 3-4")
+    existing_players = existing_players.set_index("name_key")
+    assert existing_players.index.tolist() == ["louthomas", "annlee", "bokim"]
+    assert existing_players.loc["louthomas", ["team", "goalie_skill"]].tolist() == ["red", 2]
+    assert existing_players.loc["annlee", ["team", "coach_skill"]].tolist() == ["blue", 4]
+    # Players from another division lose their team and get one point worse
+    assert pd.isnull(existing_players.loc["bokim", "team"])
+    assert existing_players.loc["bokim", "coach_skill"] == 3
+
+
+def test_translate_practice_days_and_locations():
+    parent_reqs = pd.DataFrame(
+        {
+            "M": ["Ideal", "Impossible", np.nan],
+            "T": ["Ideal", "", np.nan],
+            "W": ["Impossible", "Ideal", np.nan],
+            "R": ["", "Ideal", np.nan],
+            "F": ["Ideal", "Impossible", np.nan],
+            "east": ["Ideal", "Impossible", np.nan],
+            "west": ["", "Ideal", np.nan],
+            "northwest": ["Impossible", "", np.nan],
+            "north": ["", "", np.nan],
+            "central": ["Ideal", "", np.nan],
+            "cambridgeport": ["", "", np.nan],
+            "central east": ["", "Ideal", np.nan],
+        }
+    )
+    assert _translate_practice_days(parent_reqs, "Ideal").tolist() == ["MTF", "WR", ""]
+    assert _translate_practice_days(parent_reqs, "Impossible").tolist() == ["W", "MF", ""]
+    assert _translate_locations(parent_reqs, "Ideal").tolist() == [
+        "Ahern, Donnelly, Common, Sacramento",
+        "Maher, Sennott",
+        "",
+    ]
+    assert _translate_locations(parent_reqs, "Impossible").tolist() == [
+        "Danehy, Raymond",
+        "Ahern, Donnelly",
+        "",
+    ]
+
+
+def test_merge_backup_locations():
+    """Backup locations are the 3 closest fields not already in preferred/disallowed locations."""
+    registrations = pd.DataFrame(
+        {
+            "last_name": ["A", "B", "C", "D"],
+            "first_name": ["a", "b", "c", "d"],
+            # Everyone lives at Ahern, except d, whose address wasn't found
+            "latitude": [42.368859, 42.368859, 42.368859, np.nan],
+            "longitude": [-71.086476, -71.086476, -71.086476, np.nan],
+            "name_key": ["aa", "bb", "cc", "dd"],
+        }
+    )
+    existing_players = pd.DataFrame(columns=["coach_skill", "goalie_skill", "team", "name_key"])
+    parent_reqs = pd.DataFrame(
+        {
+            "name_key": ["bb", "cc"],
+            "preferred_locations": ["Ahern, Donnelly", "Ahern, Donnelly, Common, Sacramento"],
+            "disallowed_locations": ["", "Danehy, Raymond, Maher, Russell"],
+            "extra_comment": ["", "comment"],
+        }
+    )
+
+    players = _merge_data(existing_players, parent_reqs, registrations)
+    assert players["id"].tolist() == [0, 1, 2, 3]
+    assert players["backup_locations"].tolist() == [
+        "Ahern, Donnelly, Sennott",
+        "Sennott, Pacific, Magazine",
+        # Only 3 fields are left, so there's nothing to choose between
+        "",
+        "",
+    ]
+    assert players["comment"].tolist() == ["", "", "comment", ""]
+
+
+def test_cross_match_names():
+    df1 = pd.DataFrame({"name_key": ["annlee", "bokim", "cyjones", "dismith"]})
+    df2 = pd.DataFrame({"name_key": ["annlee", "bokimm", "cijones", "dismyth", "zz"]})
+    cross = cross_match_names(df1, df2, ("_1", "_2"), limit=3)
+    assert cross.columns.tolist() == ["name_key_1", "name_key_2", "score"]
+    # Exact matches are left out, and ties keep df1 then df2 order
+    assert cross[["name_key_1", "name_key_2"]].values.tolist() == [
+        ["bokim", "bokimm"],
+        ["cyjones", "cijones"],
+        ["dismith", "dismyth"],
+    ]
+    assert cross["score"].is_monotonic_decreasing
+    # Rows are indexed by their position among all (df1, df2) pairs
+    assert cross.index.tolist() == [0, 5, 10]
+    assert len(cross_match_names(df1, df2, ("_1", "_2"))) == 3 * 4
+    assert cross_match_names(df1, df1, ("_1", "_2"), limit=3).empty
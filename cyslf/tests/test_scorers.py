@@ -0,0 +1,109 @@
+import pytest
+
+from ..models import League, Move, Player, Team
+
+
+def make_players():
+    names = ["Ann A", "Bo B", "Cy C", "Di D", "Ed E", "Flo F", "Gus G", "Hal H"]
+    requests = ["Bo B", "Ann A, Cy C", "Ann A", "", "Di D", "Gus G", "Flo F, Ed E", "Hal H"]
+    return [
+        Player(
+            id=i,
+            first_name=name.split()[0],
+            last_name=name.split()[1],
+            grade=1 + i % 4,
+            skill=1 + i % 6,
+            coach_skill=1 + i % 6,
+            parent_skill=1 + i % 6,
+            goalie_skill=1 + i % 5,
+            unavailable_days="",
+            preferred_days="MT"[i % 2],
+            disallowed_locations="",
+            preferred_locations=["Danehy", "Ahern", ""][i % 3],
+            backup_locations=["Common", "", "Danehy"][i % 3],
+            teammate_requests=request,
+            lock=False,
+            emailed_parents=False,
+            school="school",
+            comment="",
+        )
+        for i, (name, request) in enumerate(zip(names, requests))
+    ]
+
+
+def test_score_after_matches_applying_moves():
+    """Scoring moves without applying them should match applying them and rescoring."""
+    players = make_players()
+    teams = [
+        Team(name="red", practice_day="M", location="Danehy"),
+        Team(name="blue", practice_day="T", location="Ahern"),
+        Team(name="green", practice_day="W", location="Common"),
+    ]
+    league = League(teams=teams, available_players=set(players))
+    for i, player in enumerate(players[:-1]):
+        league.apply_moves([Move(player=player, team_from=None, team_to=teams[i % 3])])
+    get_scores_after = league.scorer.get_score_function()
+
+    # Score moving the last player to each team, and then each of that team's players elsewhere
+    candidates = [([], players[-1], None, teams)]
+    for t in teams:
+        first_move = Move(player=players[-1], team_from=None, team_to=t)
+        for p in t.players:
+            candidates.append(([first_move], p, t, [u for u in teams if u is not t]))
+
+    for moves, player, team_from, teams_to in candidates:
+        scores = get_scores_after(moves, player, team_from, teams_to)
+        for team_to, score in zip(teams_to, scores):
+            all_moves = [*moves, Move(player=player, team_from=team_from, team_to=team_to)]
+            league.apply_moves(all_moves)
+            expected = league.scorer.get_score()
+            league.undo_moves(all_moves)
+            assert score == pytest.approx(expected)
+
+
+def count_friend_matches(teams):
+    """Count players with at least one requested teammate on their team, from scratch."""
+    return sum(
+        any(f"{q.first_name} {q.last_name}" in p.teammate_requests for q in t.players if q is not p)
+        for t in teams
+        for p in t.players
+    )
+
+
+def test_teammate_scores_match_recount():
+    """Teammate scores should match a full recount after moving players who list teammates."""
+    players = make_players()
+    teams = [
+        Team(name="red", practice_day="M", location="Danehy"),
+        Team(name="blue", practice_day="T", location="Ahern"),
+        Team(name="green", practice_day="W", location="Common"),
+    ]
+    league = League(teams=teams, available_players=set(players))
+    for i, player in enumerate(players):
+        league.apply_moves([Move(player=player, team_from=None, team_to=teams[i % 3])])
+    scorer = league.scorer.scorers["teammate"]
+    assert scorer.get_score() == pytest.approx(count_friend_matches(teams) / len(players))
+
+    # Move each player who lists teammates (including one who lists themself), then a second player
+    for player in [p for p in players if p.teammate_requests]:
+        team_from = next(t for t in teams if player in t.players)
+        for team_to in [t for t in teams if t is not team_from]:
+            move = Move(player=player, team_from=team_from, team_to=team_to)
+            score = scorer.get_scores_after([], player, team_from, [team_to])[0]
+            league.apply_moves([move])
+            expected = count_friend_matches(teams) / len(players)
+            assert score == pytest.approx(expected)
+            assert scorer.get_score() == pytest.approx(expected)
+
+            # get_scores_after scores from the league before any of the moves
+            others = [p for p in team_to.players if p is not player]
+            league.undo_moves([move])
+            for other in others:
+                other_to = [t for t in teams if t is not team_to]
+                scores = scorer.get_scores_after([move], other, team_to, other_to)
+                for t, score in zip(other_to, scores):
+                    moves = [move, Move(player=other, team_from=team_to, team_to=t)]
+                    league.apply_moves(moves)
+                    assert score == pytest.approx(count_friend_matches(teams) / len(players))
+                    league.undo_moves(moves)
+    assert scorer.get_score() == pytest.approx(count_friend_matches(teams) / len(players))
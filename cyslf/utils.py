@@ -6,6 +6,22 @@ TOP_TIER_SKILLS = [2, 3]
 MID_TIER_SKILLS = [4, 5, 6]
 BOTTOM_TIER_SKILLS = [7, 8, 9, 10]
 
+# Skill tiers, used as indices into per-team tier counts
+FIRST_ROUND_TIER, TOP_TIER, MID_TIER, BOTTOM_TIER = range(4)
+
+
+def get_tier(skill: int) -> int:
+    """Get the tier a skill rating falls in."""
+    if skill == FIRST_ROUND_SKILL:
+        return FIRST_ROUND_TIER
+    elif skill in TOP_TIER_SKILLS:
+        return TOP_TIER
+    elif skill in MID_TIER_SKILLS:
+        return MID_TIER
+    else:
+        return BOTTOM_TIER
+
+
 DAY_MAP = {
     "Monday": "M",
     "Tuesday": "T",
@@ -14,6 +30,17 @@ DAY_MAP = {
     "Friday": "F",
 }
 
+# Each practice day gets its own bit so sets of days can be stored as an int
+DAY_BITS = {day: 1 << i for i, day in enumerate(DAY_MAP.values())}
+
+
+def get_day_mask(days: str) -> int:
+    """Convert a string of days (eg "MWR") to a bitmask of DAY_BITS."""
+    mask = 0
+    for day in days:
+        mask |= DAY_BITS[day]
+    return mask
+
 
 FIELD_MAP = {
     "East": ["Ahern", "Donnelly"],
@@ -25,9 +52,28 @@ FIELD_MAP = {
     "Central East": ["Sennott"]
 }
 
+# Like DAY_BITS, each field location gets its own bit
+LOCATION_BITS = {
+    location: 1 << i
+    for i, location in enumerate(location for fields in FIELD_MAP.values() for location in fields)
+}
+
+
+def get_location_mask(locations: str) -> int:
+    """Convert a string of locations (eg "Ahern, Common") to a bitmask of LOCATION_BITS."""
+    mask = 0
+    for location in locations.split(", "):
+        if len(location) > 0:
+            mask |= LOCATION_BITS[location]
+    return mask
+
 
 def get_dist(x1, y1, x2, y2):
-    """Calculate the Euclidean distance between two points."""
+    """Calculate the Euclidean distance between two points.
+
+    This also works elementwise on numpy arrays / pandas Series, so prefer passing whole columns
+    over calling it once per row.
+    """
     return ((x1 - x2) ** 2 + (y1 - y2) ** 2) ** 0.5
 
 
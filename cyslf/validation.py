@@ -1,5 +1,5 @@
 import os
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, List
 
 from .utils import DAY_MAP, FIELD_MAP
 
@@ -110,6 +110,16 @@ def validate_player_locations(player: "Player"):
             )
 
 
+def validate_player_ids(players: List["Player"]):
+    ids = [player.id for player in players]
+    if len(set(ids)) != len(ids):
+        duplicate_ids = sorted({i for i in ids if ids.count(i) > 1})
+        raise ValueError(
+            f"Failed to create league. Player ids should be unique, but found duplicate ids "
+            f"{duplicate_ids}. Please correct this in the input csv and retry."
+        )
+
+
 def validate_team_name(team: "Team"):
     if not isinstance(team.name, str):
         raise ValueError(
@@ -125,11 +135,12 @@ def validate_team_name(team: "Team"):
 
 
 def validate_team_day(team: "Team"):
-    valid_days = "".join(list(DAY_MAP.values()))
+    # Teams practice on exactly one day
+    valid_days = list(DAY_MAP.values())
     if team.practice_day not in valid_days:
         raise ValueError(
             f"Failed to create team {team.name}. Practice day {team.practice_day} is not a valid "
-            f"practice day ({valid_days}). Please orrect the input csv and retry."
+            f"practice day ({''.join(valid_days)}). Please correct the input csv and retry."
         )
 
 